@@ -48,7 +48,7 @@ def main():
     # 验证结果
     if output_video:
         print(f"字幕烧录成功！输出视频路径: {output_video}")
-        file_size = os.path.getsize(output_video)
+        file_size = os.stat(output_video).st_size
         print(f"输出视频文件大小: {file_size / (1024 * 1024):.2f} MB")
         assert file_size > 1024 * 1024, "输出视频文件过小，可能未正确生成"
     else:
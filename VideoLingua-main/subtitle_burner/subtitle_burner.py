@@ -7,18 +7,180 @@
 
 import os
 import re
+import shlex
+import shutil
 import logging
+import tempfile
+import functools
 from shutil import which
 import subprocess
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 # 配置日志
 logger = logging.getLogger('subtitle_burner')
 
+# 分段并行烧录的默认分段时长（秒）；视频时长不足两段时仍使用单次转码
+SEGMENT_TIME = 60
+
+# 硬件H.264编码器及其参数，按优先级排列；字幕滤镜仍在CPU上执行，无需hwupload
+HW_ENCODERS = [
+    ("h264_nvenc", "-c:v h264_nvenc -preset p3 -tune hq -rc vbr -cq 19"),
+    ("h264_qsv", "-c:v h264_qsv -global_quality 19"),
+    ("h264_videotoolbox", "-c:v h264_videotoolbox -q:v 65"),
+]
+# 消费级显卡同时可用的硬件编码会话有限，分段并行时限制并行数
+HW_MAX_PARALLEL = 2
+
+
+@functools.lru_cache(maxsize=1)
+def _detect_hwenc() -> Optional[Tuple[str, str]]:
+    """
+    检测FFmpeg可用的硬件H.264编码器
+
+    编码器出现在 ffmpeg -encoders 中只说明FFmpeg编译时包含它，并不代表有对应硬件，
+    因此对每个候选编码器做一次极短的试编码确认。
+
+    Returns:
+        (编码器名称, 编码参数)，没有可用硬件编码器时返回None
+    """
+    try:
+        result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=30)
+    except (subprocess.SubprocessError, OSError):
+        return None
+    for name, codec_args in HW_ENCODERS:
+        if not re.search(rf"\b{name}\b", result.stdout):
+            continue
+        # 部分硬件编码器有最小分辨率限制，试编码使用256x256；
+        # 使用与正式转码相同的编码参数，避免驱动不支持某些参数时试编码通过而正式转码失败
+        probe_cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi", "-i", "color=s=256x256:d=0.1",
+                     *shlex.split(codec_args), "-f", "null", "-"]
+        try:
+            probe = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=30)
+        except (subprocess.SubprocessError, OSError):
+            continue
+        if probe.returncode == 0:
+            logger.info(f"检测到硬件编码器: {name}")
+            return name, codec_args
+        logger.debug(f"硬件编码器 {name} 试编码失败: {probe.stderr.strip()}")
+    return None
+
+
+def _run_ffmpeg(cmd_str: str) -> int:
+    """
+    执行FFmpeg命令并将其输出写入调试日志
+
+    Args:
+        cmd_str: 完整的FFmpeg命令行字符串
+
+    Returns:
+        FFmpeg进程的返回码
+    """
+    # 使用shell=True执行命令
+    process = subprocess.Popen(
+        cmd_str,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+
+    # 实时获取输出
+    while True:
+        output = process.stderr.readline()
+        if output == '' and process.poll() is not None:
+            break
+        if output:
+            logger.debug(output.strip())
+
+    return process.returncode
+
+
+def _probe_duration(video_path: str) -> Optional[float]:
+    """
+    使用ffprobe获取视频时长
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        视频时长（秒），无法获取时返回None
+    """
+    if not which("ffprobe"):
+        return None
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", video_path],
+            capture_output=True, text=True, timeout=60
+        )
+        return float(result.stdout.strip())
+    except (subprocess.SubprocessError, ValueError, OSError):
+        return None
+
+
+def _burn_segmented(video_path: str, output_path: str, subtitle_filter: str, duration: float,
+                    segment_time: int, max_workers: Optional[int], codec_args: str) -> bool:
+    """
+    将视频按时间分段并行烧录字幕，再无损拼接为一个文件
+
+    每段直接从原视频按时间点读取（-ss/-t），通过setpts把时间戳平移回原始时间轴，
+    保证字幕与画面对齐；音轨在拼接时从原视频整体复制，避免分段处的音频断点。
+
+    Args:
+        video_path: 视频文件路径
+        output_path: 输出视频文件路径
+        subtitle_filter: subtitles滤镜参数
+        duration: 视频时长（秒）
+        segment_time: 每段时长（秒）
+        max_workers: 并行转码的最大进程数，None表示按CPU核数
+        codec_args: 视频编码参数，例如 -c:v libx264 -preset veryfast -crf 18
+
+    Returns:
+        成功返回True，失败返回False
+    """
+    starts: List[int] = list(range(0, int(duration) + 1, segment_time))
+    if starts and starts[-1] >= duration:
+        starts.pop()
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, min(len(starts), max_workers or cpu_count))
+    # 各段的编码线程均分CPU，避免过度订阅
+    threads = max(1, cpu_count // workers)
+
+    work_dir = tempfile.mkdtemp(prefix=".burn_", dir=os.path.dirname(output_path))
+    try:
+        chunk_paths = [os.path.join(work_dir, f"chunk_{i:03d}.mp4") for i in range(len(starts))]
+
+        def burn_chunk(index: int) -> bool:
+            start = starts[index]
+            cmd_str = f'ffmpeg -y -ss {start} -t {segment_time} -i "{video_path}" -vf "setpts=PTS+{start}/TB,{subtitle_filter},setpts=PTS-STARTPTS" -an {codec_args} -threads {threads} "{chunk_paths[index]}"'
+            logger.debug(f"分段FFmpeg命令: {cmd_str}")
+            return _run_ffmpeg(cmd_str) == 0
+
+        logger.info(f"分段并行烧录: {len(starts)} 段, 每段 {segment_time} 秒, 并行数 {workers}")
+        # 实际工作在ffmpeg子进程中完成，线程池只负责调度和等待
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(burn_chunk, range(len(starts))))
+        if not all(results):
+            logger.error(f"分段烧录失败: {results.count(False)} 段出错")
+            return False
+
+        list_path = os.path.join(work_dir, "list.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for chunk_path in chunk_paths:
+                f.write(f"file '{os.path.basename(chunk_path)}'\n")
+
+        concat_cmd = f'ffmpeg -y -f concat -safe 0 -i "{list_path}" -i "{video_path}" -map 0:v -map 1:a? -c copy "{output_path}"'
+        logger.info(f"拼接FFmpeg命令: {concat_cmd}")
+        return _run_ffmpeg(concat_cmd) == 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
 def burn_subtitles_to_video(video_path: str, subtitle_path: str, output_path: Optional[str] = None,
                            font_size: int = 28, position: str = "bottom",
                            font_color: str = "white", outline_color: str = "black",
-                           shadow_radius: int = 1) -> Optional[str]:
+                           shadow_radius: int = 1, preset: str = "veryfast",
+                           segment_time: int = SEGMENT_TIME, max_workers: Optional[int] = None,
+                           use_hwenc: bool = True) -> Optional[str]:
     """
     将字幕烧录到视频中
 
@@ -31,6 +193,10 @@ def burn_subtitles_to_video(video_path: str, subtitle_path: str, output_path: Op
         font_color: 字体颜色
         outline_color: 字体轮廓颜色
         shadow_radius: 字幕阴影半径，默认为1
+        preset: libx264编码预设，默认为veryfast
+        segment_time: 分段并行烧录的每段时长（秒），为0时始终单次转码
+        max_workers: 分段并行烧录的最大并行数，默认为CPU核数
+        use_hwenc: 是否优先使用硬件编码器（NVENC/QSV/VideoToolbox），失败时自动回退到libx264
 
     Returns:
         成功返回输出视频路径，失败返回None
@@ -125,34 +291,47 @@ def burn_subtitles_to_video(video_path: str, subtitle_path: str, output_path: Op
 
         # 使用shell命令直接执行，避免参数转义问题
         # 设置BorderStyle=1(带轮廓)和Shadow参数(带阴影)，使背景透明
-        cmd_str = f'ffmpeg -y -i "{video_path}" -vf "subtitles={subtitle_path}:force_style=\'FontName=Arial,FontSize={font_size},PrimaryColour=&H{font_color_hex},OutlineColour=&H{outline_color_hex},BorderStyle=1,Outline=2,Shadow={shadow_radius},Bold=1\'" -c:v libx264 -crf 18 -c:a copy "{output_path}"'
+        subtitle_filter = f"subtitles={subtitle_path}:force_style='FontName=Arial,FontSize={font_size},PrimaryColour=&H{font_color_hex},OutlineColour=&H{outline_color_hex},BorderStyle=1,Outline=2,Shadow={shadow_radius},Bold=1'"
 
-        logger.info(f"FFmpeg命令: {cmd_str}")
+        # 候选编码器：可用的硬件编码器优先，libx264兜底
+        encoders = []
+        if use_hwenc:
+            hw_encoder = _detect_hwenc()
+            if hw_encoder:
+                encoders.append(hw_encoder)
+        encoders.append(("libx264", f"-c:v libx264 -preset {preset} -crf 18"))
 
-        # 使用shell=True执行命令
-        process = subprocess.Popen(
-            cmd_str,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True
-        )
+        duration = None
+        if segment_time and (os.cpu_count() or 1) > 1:
+            duration = _probe_duration(video_path)
+
+        for encoder_name, codec_args in encoders:
+            # 长视频分段并行转码；硬件编码失败时直接换下一个编码器，libx264失败时回退到单次转码
+            if duration and duration >= 2 * segment_time:
+                workers = max_workers
+                if encoder_name != "libx264":
+                    workers = min(max_workers or HW_MAX_PARALLEL, HW_MAX_PARALLEL)
+                if _burn_segmented(video_path, output_path, subtitle_filter, duration, segment_time, workers, codec_args):
+                    logger.info(f"字幕烧录成功，输出文件: {output_path}")
+                    return output_path
+                if encoder_name != "libx264":
+                    logger.warning(f"分段烧录失败（编码器: {encoder_name}），改用下一个编码器")
+                    continue
+                logger.warning(f"分段烧录失败（编码器: {encoder_name}），回退到单次转码")
+
+            cmd_str = f'ffmpeg -y -i "{video_path}" -vf "{subtitle_filter}" {codec_args} -c:a copy "{output_path}"'
+
+            logger.info(f"FFmpeg命令: {cmd_str}")
 
-        # 实时获取输出
-        while True:
-            output = process.stderr.readline()
-            if output == '' and process.poll() is not None:
-                break
-            if output:
-                logger.debug(output.strip())
-
-        # 检查命令执行结果
-        if process.returncode == 0:
-            logger.info(f"字幕烧录成功，输出文件: {output_path}")
-            return output_path
-        else:
-            logger.error(f"字幕烧录失败，返回码: {process.returncode}")
-            return None
+            returncode = _run_ffmpeg(cmd_str)
+
+            # 检查命令执行结果
+            if returncode == 0:
+                logger.info(f"字幕烧录成功，输出文件: {output_path}")
+                return output_path
+            logger.error(f"字幕烧录失败（编码器: {encoder_name}），返回码: {returncode}")
+
+        return None
 
     except Exception as e:
         logger.exception(f"烧录字幕时出错: {e}")
@@ -5,7 +5,9 @@
 测试字幕烧录模块功能
 """
 
+import importlib
 import os
+import subprocess
 import sys
 import unittest
 from unittest.mock import patch, MagicMock
@@ -131,6 +133,93 @@ class TestSubtitleBurner(unittest.TestCase):
             self.assertEqual(output_video, expected_output)
             mock_burn.assert_called_once()
 
+    @patch('subtitle_burner.subtitle_burner._detect_hwenc', return_value=None)
+    @patch('subtitle_burner.subtitle_burner.os.cpu_count', return_value=4)
+    @patch('subtitle_burner.subtitle_burner._run_ffmpeg', return_value=0)
+    @patch('subtitle_burner.subtitle_burner._probe_duration', return_value=150.0)
+    @patch('subtitle_burner.subtitle_burner.which', return_value="/usr/bin/ffmpeg")
+    def test_burn_subtitles_segmented(self, mock_which, mock_probe, mock_run, mock_cpu, mock_hwenc):
+        """测试长视频分段并行烧录"""
+        output_video = burn_subtitles_to_video(self.test_video, self.test_srt_translated, segment_time=60)
+
+        expected_output = os.path.join(self.test_dir, "test_video.zh-CN.hardcoded.mp4")
+        self.assertEqual(output_video, expected_output)
+
+        # 150秒视频分为3段，另加1次拼接
+        commands = [c.args[0] for c in mock_run.call_args_list]
+        self.assertEqual(len(commands), 4)
+        for start, cmd in zip((0, 60, 120), commands[:3]):
+            self.assertIn(f"-ss {start} -t 60", cmd)
+            self.assertIn(f"setpts=PTS+{start}/TB", cmd)
+            self.assertIn("-preset veryfast", cmd)
+        self.assertIn("-f concat", commands[3])
+        self.assertIn(f'"{expected_output}"', commands[3])
+
+    @patch('subtitle_burner.subtitle_burner._detect_hwenc', return_value=None)
+    @patch('subtitle_burner.subtitle_burner.os.cpu_count', return_value=4)
+    @patch('subtitle_burner.subtitle_burner._run_ffmpeg', return_value=0)
+    @patch('subtitle_burner.subtitle_burner._probe_duration', return_value=30.0)
+    @patch('subtitle_burner.subtitle_burner.which', return_value="/usr/bin/ffmpeg")
+    def test_burn_subtitles_short_video_single_pass(self, mock_which, mock_probe, mock_run, mock_cpu, mock_hwenc):
+        """测试短视频使用单次转码"""
+        output_video = burn_subtitles_to_video(self.test_video, self.test_srt_translated, segment_time=60)
+
+        self.assertIsNotNone(output_video)
+        mock_run.assert_called_once()
+        self.assertNotIn("-ss", mock_run.call_args.args[0])
+
+    @patch('subtitle_burner.subtitle_burner._detect_hwenc', return_value=("h264_nvenc", "-c:v h264_nvenc -preset p3"))
+    @patch('subtitle_burner.subtitle_burner._probe_duration', return_value=30.0)
+    @patch('subtitle_burner.subtitle_burner.which', return_value="/usr/bin/ffmpeg")
+    def test_burn_subtitles_hwenc_fallback(self, mock_which, mock_probe, mock_hwenc):
+        """测试硬件编码失败时回退到libx264"""
+        with patch('subtitle_burner.subtitle_burner._run_ffmpeg', side_effect=[1, 0]) as mock_run:
+            output_video = burn_subtitles_to_video(self.test_video, self.test_srt_translated)
+
+        self.assertIsNotNone(output_video)
+        commands = [c.args[0] for c in mock_run.call_args_list]
+        self.assertEqual(len(commands), 2)
+        self.assertIn("h264_nvenc", commands[0])
+        self.assertIn("-c:v libx264", commands[1])
+
+    @patch('subtitle_burner.subtitle_burner._detect_hwenc', return_value=("h264_nvenc", "-c:v h264_nvenc -preset p3"))
+    @patch('subtitle_burner.subtitle_burner.os.cpu_count', return_value=4)
+    @patch('subtitle_burner.subtitle_burner._run_ffmpeg', return_value=0)
+    @patch('subtitle_burner.subtitle_burner._probe_duration', return_value=150.0)
+    @patch('subtitle_burner.subtitle_burner.which', return_value="/usr/bin/ffmpeg")
+    def test_burn_subtitles_segmented_hwenc_failure(self, mock_which, mock_probe, mock_run, mock_cpu, mock_hwenc):
+        """测试分段硬件编码失败时直接改用libx264分段，不再用同一编码器单次转码"""
+        with patch('subtitle_burner.subtitle_burner._burn_segmented', side_effect=[False, True]) as mock_segmented:
+            output_video = burn_subtitles_to_video(self.test_video, self.test_srt_translated, segment_time=60)
+
+        self.assertIsNotNone(output_video)
+        mock_run.assert_not_called()
+        codecs = [c.args[6] for c in mock_segmented.call_args_list]
+        self.assertIn("h264_nvenc", codecs[0])
+        self.assertIn("-c:v libx264", codecs[1])
+
+    def test_detect_hwenc_requires_working_encoder(self):
+        """测试硬件编码器需通过试编码才被选用"""
+        burner_module = importlib.import_module('subtitle_burner.subtitle_burner')
+
+        def fake_run(cmd, **kwargs):
+            if "-encoders" in cmd:
+                return subprocess.CompletedProcess(cmd, 0, stdout=" V....D h264_nvenc\n V....D h264_qsv\n", stderr="")
+            # 只有QSV试编码成功
+            return subprocess.CompletedProcess(cmd, 0 if "h264_qsv" in cmd else 1, stdout="", stderr="No NVENC capable devices found")
+
+        burner_module._detect_hwenc.cache_clear()
+        try:
+            with patch('subtitle_burner.subtitle_burner.subprocess.run', side_effect=fake_run) as mock_run:
+                self.assertEqual(burner_module._detect_hwenc()[0], "h264_qsv")
+            self.assertEqual(mock_run.call_count, 3)
+            # 试编码使用与正式转码相同的编码参数
+            qsv_args = dict(burner_module.HW_ENCODERS)["h264_qsv"].split()
+            probe_cmd = mock_run.call_args_list[-1].args[0]
+            self.assertEqual(probe_cmd[probe_cmd.index("-c:v"):probe_cmd.index("-f", probe_cmd.index("-c:v"))], qsv_args)
+        finally:
+            burner_module._detect_hwenc.cache_clear()
+
     def test_burn_real_subtitles_to_video(self):
         """测试使用实际视频和字幕文件进行字幕烧录"""
         # 检查输入文件是否存在
@@ -1,33 +1,271 @@
-"""Client wrapper for Zhipu (BigModel) API
+"""Chat completion clients for Zhipu (BigModel) and DeepSeek
 
-This file provides a compatible client interface used by the rest of the project.
-It will read API keys from `ZHIPU_API_KEY` or `BIGMODEL_API_KEY` (falling back to `DEEPSEEK_API_KEY` for compatibility).
+Both providers expose an OpenAI-compatible chat endpoint, so the shared logic lives in
+`BaseChatClient` and the provider subclasses only declare endpoints, defaults and env vars.
+Use `create_client()` to pick the provider from the `CHAT_PROVIDER` env var (`zhipu` or
+`deepseek`) or, failing that, from the configured base URL. Zhipu is the default; it reads
+`ZHIPU_API_KEY` or `BIGMODEL_API_KEY` (falling back to `DEEPSEEK_API_KEY` for compatibility).
 """
 from __future__ import annotations
 
 import os
+import re
+import json
+import asyncio
+import hashlib
+import importlib.util
 import time
+import random
 import logging
-from typing import Optional, Dict, Any, List, Union
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, List, Union, Deque, Mapping, Iterator, Tuple, Type
 
 import requests
+from requests.adapters import HTTPAdapter
+
+# Optional: httpx powers the asyncio API (agenerate); HTTP/2 additionally needs the h2 package
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+# Optional: orjson speeds up request/response (de)serialization
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Optional: diskcache persists deterministic (temperature=0) completions across runs
+try:
+    import diskcache
+except ImportError:  # pragma: no cover - optional dependency
+    diskcache = None
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_BASE_URL = "https://open.bigmodel.cn"
 CHAT_PATH = "/api/paas/v4/chat/completions"
 MODELS_PATH = "/api/paas/v4/models"
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+# Pool sizing for the shared session; large enough for parallel variant requests
+POOL_CONNECTIONS = 32
+POOL_MAXSIZE = 64
+
+# Client-side rate limiting defaults (overridable per provider, e.g. BIGMODEL_RPM)
+DEFAULT_RPM = 60
+MAX_CONCURRENCY = 16.0
+ASYNC_MAX_CONNECTIONS = 32
+# Responses slower than this stop the limiter from growing concurrency
+TARGET_LATENCY = 60.0
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+CACHE_DIR = os.path.expanduser("~/.cache/videolingua/llm")
+# The model list rarely changes; keep it in memory for an hour
+MODELS_TTL = 3600.0
+
+DEFAULT_SYSTEM_PROMPT = "你是一个有用的AI助手。"
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: Optional[str]) -> float:
+    """Parse rate-limit reset values such as "20ms", "1.5s", "6m0s" or plain seconds."""
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    return sum(float(num) * _DURATION_UNITS[unit] for num, unit in _DURATION_RE.findall(value))
+
+
+def _parse_retry_after(headers: Optional[Mapping[str, str]]) -> float:
+    """Return the Retry-After delay in seconds (0 if absent or unparseable)."""
+    if not headers:
+        return 0.0
+    value = headers.get("retry-after")
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _decorrelated_jitter(previous: float) -> float:
+    """Next backoff delay using decorrelated jitter."""
+    return min(BACKOFF_CAP, random.uniform(BACKOFF_BASE, previous * 3))
+
+
+class _RateLimiter:
+    """Rate limiter shared by all clients that talk to the same base URL.
+
+    Requests are admitted while both a sliding one-minute window (seeded with the
+    provider's RPM) and an AIMD concurrency limit allow it: fast successful
+    responses raise the limit by 0.5, 429/5xx responses and network errors halve it.
+    Provider rate-limit headers pause admission when the remaining quota runs low.
+    """
+
+    WINDOW = 60.0
+    # Longest admission pause from headers; a daily-quota reset (e.g. "6h") must not hang callers silently
+    MAX_PAUSE = WINDOW
+
+    def __init__(self, rpm: int = DEFAULT_RPM, max_concurrency: float = MAX_CONCURRENCY, target_latency: float = TARGET_LATENCY):
+        self.rpm = rpm
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.concurrency = max(1.0, max_concurrency / 2)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._sent: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Reserve a request slot. Returns 0 on success, otherwise seconds to wait before trying again."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self.paused_until:
+                return self.paused_until - now
+            while self._sent and now - self._sent[0] >= self.WINDOW:
+                self._sent.popleft()
+            if len(self._sent) >= self.rpm:
+                return self.WINDOW - (now - self._sent[0])
+            if self.in_flight >= int(self.concurrency):
+                return 0.05
+            self._sent.append(now)
+            self.in_flight += 1
+            return 0.0
 
+    def acquire(self) -> None:
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
 
-class ZhipuClient:
-    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: Optional[Union[float, tuple]] = None):
-        # Prefer ZHIPU or BIGMODEL env vars, fall back to DEEPSEEK_API_KEY for compatibility
-        self.api_key = api_key or os.getenv("ZHIPU_API_KEY") or os.getenv("BIGMODEL_API_KEY") or os.getenv("DEEPSEEK_API_KEY")
+    def abandon(self) -> None:
+        """Give back a slot whose request never completed (e.g. the task was cancelled)."""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def release(self, status: Optional[int], latency: float, headers: Optional[Mapping[str, str]] = None) -> float:
+        """Record the outcome of a request (status None for network errors).
+
+        Returns the server-requested retry delay in seconds, or 0 if none was given.
+        """
+        retry_after = _parse_retry_after(headers)
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if status is None or status == 429 or status >= 500:
+                self.concurrency = max(1.0, self.concurrency * 0.5)
+            elif status < 300 and latency <= self.target_latency:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 0.5)
+
+            if headers:
+                try:
+                    limit = int(headers.get("x-ratelimit-limit-requests", ""))
+                    remaining = int(headers.get("x-ratelimit-remaining-requests", ""))
+                except ValueError:
+                    limit = remaining = None
+                if limit:
+                    self.rpm = limit
+                    if remaining is not None and remaining < limit * 0.1:
+                        reset = _parse_duration(headers.get("x-ratelimit-reset-requests")) or retry_after or self.WINDOW
+                        self._pause(now, reset, f"{remaining}/{limit} requests left")
+            if retry_after:
+                self._pause(now, retry_after, "server asked to retry later")
+        return retry_after
+
+    def _pause(self, now: float, seconds: float, reason: str) -> None:
+        # Caller holds the lock
+        pause = min(seconds, self.MAX_PAUSE)
+        if now + pause > self.paused_until:
+            self.paused_until = now + pause
+            logger.warning("Rate limited (%s): pausing new requests for %.1f seconds (server reset in %.1f seconds)", reason, pause, seconds)
+
+
+def _make_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Shared by every client so keep-alive connections (and their TLS sessions) are reused.
+# It carries no credentials; auth headers are sent per request.
+_SHARED_SESSION = _make_session()
+
+
+class BaseChatClient:
+    """Shared implementation for OpenAI-compatible chat completion providers."""
+
+    DISPLAY_NAME = ""
+    DEFAULT_BASE_URL = ""
+    CHAT_PATH = "/chat/completions"
+    MODELS_PATH = "/models"
+    MODELS_METHOD = "GET"
+    DEFAULT_MODEL = ""
+    # Models known to accept n > 1; others get one request per variant instead of a rejected call
+    SUPPORTS_N: frozenset = frozenset()
+    # Environment variables, in order of preference
+    API_KEY_ENVS: Tuple[str, ...] = ()
+    BASE_URL_ENV = ""
+    TIMEOUT_ENVS: Tuple[str, ...] = ()
+    RPM_ENVS: Tuple[str, ...] = ()
+    # Raised when the server rejects a request outright (e.g. an unsupported n); callers may fall back
+    BATCH_REJECTED_ERRORS: Tuple[Type[BaseException], ...] = (requests.HTTPError,)
+
+    # One limiter per base URL, shared across client instances
+    _limiters: Dict[str, _RateLimiter] = {}
+    _limiters_lock = threading.Lock()
+    # httpx.AsyncClient is bound to the event loop it was first used on
+    _async_client: Optional["httpx.AsyncClient"] = None
+    _async_loop: Optional[asyncio.AbstractEventLoop] = None
+    # Opened lazily on first cacheable call
+    _disk_cache: Optional["diskcache.Cache"] = None
+    # (base URL, models path) -> (expiry, model ids)
+    _models_cache: Dict[Tuple[str, str], Tuple[float, Tuple[str, ...]]] = {}
+    # Base URLs whose connection has already been pre-warmed
+    _warmed: set = set()
+
+    @classmethod
+    def api_key_from_env(cls) -> Optional[str]:
+        for name in cls.API_KEY_ENVS:
+            value = os.getenv(name)
+            if value:
+                return value
+        return None
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: Optional[Union[float, tuple]] = None, use_cache: bool = True):
+        self.api_key = api_key or self.api_key_from_env()
         if not self.api_key:
-            raise ValueError("API key not set. Set ZHIPU_API_KEY or BIGMODEL_API_KEY environment variable.")
-        self.base_url = base_url or os.getenv("BIGMODEL_BASE_URL", DEFAULT_BASE_URL)
+            raise ValueError(f"API key not set. Set {' or '.join(self.API_KEY_ENVS[:2])} environment variable.")
+        self.base_url = base_url or os.getenv(self.BASE_URL_ENV, self.DEFAULT_BASE_URL)
         # timeout can be a single float (total/ read timeout) or a (connect, read) tuple
-        env_timeout = os.getenv("BIGMODEL_TIMEOUT") or os.getenv("ZHIPU_TIMEOUT")
+        env_timeout = next((os.getenv(name) for name in self.TIMEOUT_ENVS if os.getenv(name)), None)
         if timeout is not None:
             self.timeout = timeout
         elif env_timeout:
@@ -42,46 +280,91 @@ class ZhipuClient:
         else:
             # short connect timeout, longer read timeout
             self.timeout = (5.0, 180.0)
-        self.session = requests.Session()
-        self.session.headers.update({"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"})
+        # Only temperature=0 calls are cached, and only when diskcache is installed
+        self.use_cache = use_cache and diskcache is not None
+        self.session = _SHARED_SESSION
+        self._auth_header = f"Bearer {self.api_key}"
+        self._headers = {"Authorization": self._auth_header, "Content-Type": "application/json"}
+        self._limiter = self._limiter_for(self.base_url)
+        # Full endpoint URLs, built once instead of on every (retried) request
+        root = self.base_url.rstrip("/")
+        self._urls = {self.CHAT_PATH: root + self.CHAT_PATH, self.MODELS_PATH: root + self.MODELS_PATH}
+        # Open DNS+TCP+TLS in the background while the caller builds its prompt; CHAT_PREWARM=0 disables
+        if os.getenv("CHAT_PREWARM", "1") != "0":
+            self._prewarm()
+
+    def _prewarm(self) -> None:
+        with BaseChatClient._limiters_lock:
+            if self.base_url in BaseChatClient._warmed:
+                return
+            BaseChatClient._warmed.add(self.base_url)
+        threading.Thread(target=self._warm_connection, name="chat-prewarm", daemon=True).start()
+
+    def _warm_connection(self) -> None:
+        try:
+            # Leaves a keep-alive connection in the shared session's pool
+            self.session.head(self.base_url.rstrip("/") + "/", timeout=self.timeout).close()
+        except requests.RequestException as exc:
+            logger.debug("Connection pre-warm failed for %s: %s", self.base_url, exc)
+
+    @classmethod
+    def _limiter_for(cls, base_url: str) -> _RateLimiter:
+        with cls._limiters_lock:
+            limiter = cls._limiters.get(base_url)
+            if limiter is None:
+                env_rpm = next((os.getenv(name) for name in cls.RPM_ENVS if os.getenv(name)), None)
+                try:
+                    rpm = int(env_rpm) if env_rpm else DEFAULT_RPM
+                except ValueError:
+                    rpm = DEFAULT_RPM
+                limiter = cls._limiters[base_url] = _RateLimiter(rpm=rpm)
+            return limiter
 
     def _post(self, path: str, payload: Dict[str, Any], stream: bool = False, max_retries: int = 3) -> Union[Dict[str, Any], requests.Response]:
-        url = self.base_url.rstrip("/") + path
-        backoff = 1.0
+        return self._request("POST", path, payload, stream=stream, max_retries=max_retries)
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None, stream: bool = False, max_retries: int = 3) -> Union[Dict[str, Any], requests.Response]:
+        url = self._urls.get(path) or (self.base_url.rstrip("/") + path)
+        body = _dumps(payload) if payload is not None else None
+        backoff = BACKOFF_BASE
         for attempt in range(1, max_retries + 1):
+            self._limiter.acquire()
+            started = time.monotonic()
             try:
-                if stream:
-                    resp = self.session.post(url, json=payload, timeout=self.timeout, stream=True)
-                    resp.raise_for_status()
-                    return resp
-                resp = self.session.post(url, json=payload, timeout=self.timeout)
-                if resp.status_code == 429:
-                    logger.warning("Rate limited, retrying in %s seconds", backoff)
-                    time.sleep(backoff)
-                    backoff *= 2
-                    continue
-                resp.raise_for_status()
-                return resp.json()
-            except requests.ReadTimeout as exc:
-                logger.warning("Request timed out (attempt %s/%s): %s. Consider increasing timeout via BIGMODEL_TIMEOUT or ZHIPU_TIMEOUT env var or passing a higher timeout to ZhipuClient.", attempt, max_retries, exc)
-                if attempt == max_retries:
-                    raise
-                time.sleep(backoff)
-                backoff *= 2
+                resp = self.session.request(method, url, data=body, headers=self._headers, timeout=self.timeout, stream=stream)
             except requests.RequestException as exc:
-                logger.exception("Request failed (attempt %s/%s): %s", attempt, max_retries, exc)
+                self._limiter.release(None, time.monotonic() - started)
+                if isinstance(exc, requests.ReadTimeout):
+                    logger.warning("Request timed out (attempt %s/%s): %s. Consider increasing timeout via %s env var or passing a higher timeout to %s.", attempt, max_retries, exc, " or ".join(self.TIMEOUT_ENVS), type(self).__name__)
+                else:
+                    logger.exception("Request failed (attempt %s/%s): %s", attempt, max_retries, exc)
                 if attempt == max_retries:
                     raise
+                backoff = _decorrelated_jitter(backoff)
                 time.sleep(backoff)
-                backoff *= 2
+                continue
+
+            retry_after = self._limiter.release(resp.status_code, time.monotonic() - started, resp.headers)
+            if (resp.status_code == 429 or resp.status_code >= 500) and attempt < max_retries:
+                backoff = _decorrelated_jitter(backoff)
+                delay = max(retry_after, backoff)
+                logger.warning("Server returned %s (attempt %s/%s), retrying in %.1f seconds", resp.status_code, attempt, max_retries, delay)
+                resp.close()
+                time.sleep(delay)
+                continue
+            # Other 4xx errors are not retryable; surface them immediately
+            resp.raise_for_status()
+            if stream:
+                return resp
+            return _loads(resp.content)
         raise RuntimeError("Failed to make request")
 
-    def generate(self, prompt: str, model: str = "glm-4.5-flash", temperature: float = 1.0, n: int = 1, system: Optional[str] = None, max_tokens: Optional[int] = None, stream: bool = False, **kwargs) -> Union[str, List[str]]:
-        """Generate text using Zhipu chat completions endpoint.
+    def generate(self, prompt: str, model: Optional[str] = None, temperature: float = 1.0, n: int = 1, system: Optional[str] = None, max_tokens: Optional[int] = None, stream: bool = False, **kwargs) -> Union[str, List[str]]:
+        """Generate text using the provider's chat completions endpoint.
 
         Args:
             prompt: user prompt string
-            model: model name (e.g., glm-4.7)
+            model: model name (defaults to the provider's DEFAULT_MODEL, e.g. glm-4.5-flash)
             temperature: sampling temperature
             n: number of variants to return (if supported by provider)
             system: optional system prompt
@@ -91,23 +374,97 @@ class ZhipuClient:
         Returns:
             string (if n==1) or list of strings
         """
+        if n and n > 1 and not stream and not self.supports_n(model):
+            with ThreadPoolExecutor(max_workers=min(n, int(MAX_CONCURRENCY))) as ex:
+                return list(ex.map(lambda _: self.generate(prompt, model=model, temperature=temperature, n=1, system=system, max_tokens=max_tokens, **kwargs), range(n)))
+
+        payload = self._build_payload(prompt, model=model, temperature=temperature, n=n, system=system, max_tokens=max_tokens, stream=stream, **kwargs)
+        if stream:
+            return self._post(self.CHAT_PATH, payload, stream=True)
+
+        cache = self._get_disk_cache() if self.use_cache and temperature == 0 else None
+        if cache is not None:
+            key = self._cache_key(payload)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        result = self._parse_response(self._post(self.CHAT_PATH, payload), n)
+        if cache is not None:
+            cache.set(key, result)
+        return result
+
+    @classmethod
+    def _get_disk_cache(cls) -> Optional["diskcache.Cache"]:
+        if cls._disk_cache is None:
+            try:
+                cls._disk_cache = diskcache.Cache(CACHE_DIR)
+            except Exception as e:
+                logger.warning("Disk cache unavailable (%s): %s", CACHE_DIR, e)
+                return None
+        return cls._disk_cache
+
+    def _cache_key(self, payload: Dict[str, Any]) -> str:
+        # Payload covers model, messages (system + prompt), temperature, n and extra params
+        raw = json.dumps({"u": self.base_url, "p": payload}, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def generate_stream(self, prompt: str, model: Optional[str] = None, temperature: float = 1.0, system: Optional[str] = None, max_tokens: Optional[int] = None, **kwargs) -> Iterator[str]:
+        """Stream a single completion, yielding content deltas as they arrive.
+
+        Parses the server-sent events incrementally instead of buffering the whole body.
+        """
+        payload = self._build_payload(prompt, model=model, temperature=temperature, n=1, system=system, max_tokens=max_tokens, stream=True, **kwargs)
+        resp = self._post(self.CHAT_PATH, payload, stream=True)
+        with resp:
+            for line in resp.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                try:
+                    delta = _loads(data)["choices"][0]["delta"].get("content")
+                except (KeyError, IndexError, TypeError, ValueError):
+                    continue
+                if delta:
+                    yield delta
+
+    async def agenerate(self, prompt: str, model: Optional[str] = None, temperature: float = 1.0, n: int = 1, system: Optional[str] = None, max_tokens: Optional[int] = None, **kwargs) -> Union[str, List[str]]:
+        """Async variant of `generate` backed by httpx (streaming is not supported)."""
+        if n and n > 1 and not self.supports_n(model):
+            return list(await asyncio.gather(*[self.agenerate(prompt, model=model, temperature=temperature, n=1, system=system, max_tokens=max_tokens, **kwargs) for _ in range(n)]))
+        payload = self._build_payload(prompt, model=model, temperature=temperature, n=n, system=system, max_tokens=max_tokens, stream=False, **kwargs)
+        return self._parse_response(await self._apost(self.CHAT_PATH, payload), n)
+
+    def supports_n(self, model: Optional[str] = None) -> bool:
+        """Whether `model` (default: DEFAULT_MODEL) accepts the n parameter."""
+        return (model or self.DEFAULT_MODEL) in self.SUPPORTS_N
+
+    def _build_payload(self, prompt: str, model: Optional[str], temperature: float, n: int, system: Optional[str], max_tokens: Optional[int], stream: bool, **kwargs) -> Dict[str, Any]:
         messages = []
         if system is None:
-            system = "你是一个有用的AI助手。"
+            system = DEFAULT_SYSTEM_PROMPT
         messages.append({"role": "system", "content": system})
         messages.append({"role": "user", "content": prompt})
 
-        payload: Dict[str, Any] = {"model": model, "messages": messages, "temperature": temperature, "stream": stream}
+        payload: Dict[str, Any] = {"model": model or self.DEFAULT_MODEL, "messages": messages, "temperature": temperature, "stream": stream}
         if max_tokens is not None:
             payload["max_tokens"] = max_tokens
-        if n is not None:
+        if n and n > 1:
             payload["n"] = n
         payload.update(kwargs)
+        return payload
 
-        if stream:
-            return self._post(CHAT_PATH, payload, stream=True)
-
-        data = self._post(CHAT_PATH, payload)
+    @staticmethod
+    def _parse_response(data: Any, n: int) -> Union[str, List[str]]:
+        # Fast path for the standard chat completions shape
+        try:
+            choices = data["choices"]
+            if n == 1:
+                return choices[0]["message"]["content"]
+            return [c["message"]["content"] for c in choices]
+        except (KeyError, TypeError, IndexError):
+            pass
 
         # Parse response defensively
         if isinstance(data, dict):
@@ -135,24 +492,160 @@ class ZhipuClient:
                 return [str(x) for x in data["data"]]
         return str(data)
 
-    def list_models(self) -> List[str]:
+    @classmethod
+    async def _get_async_client(cls) -> "httpx.AsyncClient":
+        if httpx is None:
+            raise RuntimeError("agenerate requires the httpx package (pip install 'httpx[http2]').")
+        loop = asyncio.get_running_loop()
+        # Stored on BaseChatClient (not cls) so every provider shares one client and aclose() reaches it
+        client = BaseChatClient._async_client
+        if client is None or BaseChatClient._async_loop is not loop:
+            previous = client
+            # Swap before awaiting so concurrent tasks on this loop share the new client
+            client = BaseChatClient._async_client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS),
+            )
+            BaseChatClient._async_loop = loop
+            # A client is bound to the loop that created it; close the previous loop's one instead of leaking it
+            await cls._close_async_client(previous)
+        return client
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the shared async client (call before the event loop used by agenerate shuts down)."""
+        client = BaseChatClient._async_client
+        BaseChatClient._async_client = BaseChatClient._async_loop = None
+        await cls._close_async_client(client)
+
+    @staticmethod
+    async def _close_async_client(client: Optional["httpx.AsyncClient"]) -> None:
+        if client is None:
+            return
         try:
-            data = self._post(MODELS_PATH, {})
+            await client.aclose()
+        except Exception as e:
+            logger.debug("Closing async client failed: %s", e)
+
+    def _httpx_timeout(self) -> "httpx.Timeout":
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout[0], self.timeout[-1]
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(self.timeout)
+
+    async def _apost(self, path: str, payload: Dict[str, Any], max_retries: int = 3) -> Dict[str, Any]:
+        client = await self._get_async_client()
+        url = self._urls.get(path) or (self.base_url.rstrip("/") + path)
+        backoff = BACKOFF_BASE
+        for attempt in range(1, max_retries + 1):
+            while True:
+                wait = self._limiter.try_acquire()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            started = time.monotonic()
+            try:
+                resp = await client.post(url, content=_dumps(payload), headers=self._headers, timeout=self._httpx_timeout())
+            except BaseException as exc:
+                if not isinstance(exc, httpx.TransportError):
+                    # Cancelled (wait_for, gather failure) or an unexpected error: give the slot back untouched
+                    self._limiter.abandon()
+                    raise
+                self._limiter.release(None, time.monotonic() - started)
+                logger.warning("Async request failed (attempt %s/%s): %s", attempt, max_retries, exc)
+                if attempt == max_retries:
+                    raise
+                backoff = _decorrelated_jitter(backoff)
+                await asyncio.sleep(backoff)
+                continue
+
+            retry_after = self._limiter.release(resp.status_code, time.monotonic() - started, resp.headers)
+            if (resp.status_code == 429 or resp.status_code >= 500) and attempt < max_retries:
+                backoff = _decorrelated_jitter(backoff)
+                delay = max(retry_after, backoff)
+                logger.warning("Server returned %s (attempt %s/%s), retrying in %.1f seconds", resp.status_code, attempt, max_retries, delay)
+                await asyncio.sleep(delay)
+                continue
+            resp.raise_for_status()
+            return _loads(resp.content)
+        raise RuntimeError("Failed to make request")
+
+    def list_models(self) -> Tuple[str, ...]:
+        """Model ids offered by the provider, cached for MODELS_TTL seconds.
+
+        Returns an immutable tuple since the cached value is shared; failures return () and are not cached.
+        """
+        key = (self.base_url, self.MODELS_PATH)
+        cached = BaseChatClient._models_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        try:
+            data = self._request(self.MODELS_METHOD, self.MODELS_PATH, {} if self.MODELS_METHOD == "POST" else None)
             if isinstance(data, dict) and "data" in data:
-                return [m.get("id", m.get("model", "")) for m in data["data"]]
-            return []
+                models = tuple(m.get("id", m.get("model", "")) for m in data["data"])
+            else:
+                models = ()
         except Exception as e:
             logger.error("Failed to list models: %s", e)
-            return []
+            return ()
+        BaseChatClient._models_cache[key] = (time.monotonic() + MODELS_TTL, models)
+        return models
+
+
+class ZhipuClient(BaseChatClient):
+    DISPLAY_NAME = "Zhipu/BigModel"
+    DEFAULT_BASE_URL = DEFAULT_BASE_URL
+    CHAT_PATH = CHAT_PATH
+    MODELS_PATH = MODELS_PATH
+    MODELS_METHOD = "POST"
+    DEFAULT_MODEL = "glm-4.5-flash"
+    SUPPORTS_N = frozenset({"glm-4.5-flash", "glm-4"})
+    # Prefer ZHIPU or BIGMODEL env vars, fall back to DEEPSEEK_API_KEY for compatibility
+    API_KEY_ENVS = ("ZHIPU_API_KEY", "BIGMODEL_API_KEY", "DEEPSEEK_API_KEY")
+    BASE_URL_ENV = "BIGMODEL_BASE_URL"
+    TIMEOUT_ENVS = ("BIGMODEL_TIMEOUT", "ZHIPU_TIMEOUT")
+    RPM_ENVS = ("BIGMODEL_RPM", "ZHIPU_RPM")
+
+
+class DeepseekClient(BaseChatClient):
+    DISPLAY_NAME = "DeepSeek"
+    DEFAULT_BASE_URL = DEEPSEEK_BASE_URL
+    DEFAULT_MODEL = "deepseek-chat"
+    API_KEY_ENVS = ("DEEPSEEK_API_KEY",)
+    BASE_URL_ENV = "DEEPSEEK_BASE_URL"
+    TIMEOUT_ENVS = ("DEEPSEEK_TIMEOUT",)
+    RPM_ENVS = ("DEEPSEEK_RPM",)
+
+
+PROVIDERS: Dict[str, Type[BaseChatClient]] = {
+    "zhipu": ZhipuClient,
+    "bigmodel": ZhipuClient,
+    "deepseek": DeepseekClient,
+}
+
+
+def detect_provider(base_url: Optional[str] = None) -> str:
+    """Provider name from CHAT_PROVIDER, else sniffed from the base URL (defaults to zhipu)."""
+    provider = os.getenv("CHAT_PROVIDER", "").strip().lower()
+    if provider:
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown CHAT_PROVIDER {provider!r}; expected one of {sorted(PROVIDERS)}")
+        return provider
+    url = base_url or os.getenv("DEEPSEEK_BASE_URL") or os.getenv("BIGMODEL_BASE_URL") or ""
+    return "deepseek" if "deepseek" in url.lower() else "zhipu"
 
 
-# Backwards compatibility: keep name DeepseekClient used by other modules
-DeepseekClient = ZhipuClient
+def create_client(provider: Optional[str] = None, **kwargs) -> BaseChatClient:
+    """Instantiate the client for `provider` (or the detected one); kwargs go to the constructor."""
+    name = (provider or detect_provider(kwargs.get("base_url"))).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown chat provider {name!r}; expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name](**kwargs)
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    client = ZhipuClient()
+    client = create_client()
 
     print("测试生成...")
     print(client.generate("请为一款面向中小企业的社交媒体管理工具写一句抓人开头", n=1))
@@ -1,9 +1,24 @@
-"""Copy generation utilities using DeepseekClient"""
+"""Copy generation utilities built on the chat clients in client.py"""
 from __future__ import annotations
 
-from typing import Optional, List, Union
+import functools
+import io
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, List, Union
 
-from client import DeepseekClient
+# Only needed for annotations; keeps `import generator` free of requests so --mock starts fast
+if TYPE_CHECKING:
+    from client import BaseChatClient
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent requests when variants have to be fetched one by one
+MAX_PARALLEL_REQUESTS = 8
+# HTTP statuses meaning the provider rejected the request parameters (e.g. an unsupported n)
+PARAM_REJECTED_STATUS = (400, 422)
 
 
 
@@ -14,53 +29,188 @@ VIDEO_TEMPLATE = (
 )
 
 
+_VIDEO_PROMPT_TMPL = (
+    "## 任务描述\n"
+    "你是一位专业的视频文案撰写专家。请根据以下要求生成视频文案：\n"
+    "\n"
+    "## 视频/平台信息\n"
+    "平台: {platform}\n"
+    "形式: {fmt}\n"
+    "\n"
+    "## 产品/服务描述\n"
+    "{brief}\n"
+    "\n"
+    "## 具体要求\n"
+    "1. 语气风格：{tone}\n"
+    "2. 文案长度：{length}\n"
+    "3. 目标受众：{audience}\n"
+    "\n"
+    "## 输出要求\n"
+    "- 提供一个抓人开头（前5秒），给出3个要点，并以明确的CTA结尾。\n"
+    "- 如果 format 是 caption，则输出简短有力的标题和若干标签。\n"
+    "- 保持贴合平台规范。\n"
+    "- 要求每个时间段的字数在150-200字每分钟。\n"
+    "- 按照json格式输出，包含以下字段："
+    "  - script/caption: 文案内容\n"
+    "  - time 文案内容的时间段"
+    "  - title 每段文案的标题（仅限caption）"
+)
+
+
+# Appended to the prompt when similarity == 100 (the only value that adds a suffix)
+_SIMILARITY_SUFFIX = (
+    "- 按照100%的相似度生成不同版本的文案。\n"
+    "确保与原文案在结构和内容上有明显区别，但仍然传达相同的信息和情感。\n"
+)
+
+# Wraps several per-brief prompts into one request that returns a JSON array
+_BATCH_PROMPT_TMPL = (
+    "下面共有 {count} 个视频文案任务，请分别完成，每个任务生成 {n} 个不同版本。\n"
+    "只返回一个 JSON 数组，长度为 {total}，每个元素对应一个（任务, 版本）组合，格式为："
+    "{{\"brief_idx\": 任务序号(从0开始), \"variant_idx\": 版本序号(从0开始), \"text\": 文案内容}}。\n"
+    "各任务的具体要求如下：\n\n"
+    "{tasks}"
+)
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.S)
+
+
+def _parse_batch_reply(text: Union[str, List[str]], count: int, n: int) -> List[List[str]]:
+    """Group a JSON-array batch reply into `count` lists of up to `n` variants (missing ones are empty)."""
+    grouped: List[List[str]] = [[] for _ in range(count)]
+    if isinstance(text, list):
+        text = text[0] if text else ""
+    match = _JSON_ARRAY_RE.search(text or "")
+    if not match:
+        return grouped
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return grouped
+    for item in items if isinstance(items, list) else []:
+        try:
+            idx = int(item["brief_idx"])
+            value = item["text"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if value is None:
+            continue
+        # Models often answer with the schema object itself; keep it as JSON, not a Python repr
+        content = (value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)).strip()
+        if 0 <= idx < count and content and len(grouped[idx]) < n:
+            grouped[idx].append(content)
+    return grouped
+
+
+@functools.lru_cache(maxsize=256)
+def _render_video_prompt(brief: str, platform: str, fmt: str, tone: str, length: str, audience: str) -> str:
+    return _VIDEO_PROMPT_TMPL.format_map({"brief": brief, "platform": platform, "fmt": fmt, "tone": tone, "length": length, "audience": audience})
+
+
 class VideoGenerator:
-    def __init__(self, client: "DeepseekClient", default_tone: str = "energetic", default_length: str = "short"):
+    def __init__(self, client: "BaseChatClient", default_tone: str = "energetic", default_length: str = "short"):
         self.client = client
         self.default_tone = default_tone
         self.default_length = default_length
 
     def build_prompt(self, brief: str, platform: str = "short-video", fmt: str = "script", tone: Optional[str] = None, length: Optional[str] = None, audience: str = "general") -> str:
-        tone = tone or self.default_tone
-        length = length or self.default_length
-        prompt_parts = [
-            "## 任务描述",
-            "你是一位专业的视频文案撰写专家。请根据以下要求生成视频文案：",
-            "",
-            "## 视频/平台信息",
-            f"平台: {platform}",
-            f"形式: {fmt}",
-            "",
-            "## 产品/服务描述",
-            f"{brief}",
-            "",
-            "## 具体要求",
-            f"1. 语气风格：{tone}",
-            f"2. 文案长度：{length}",
-            f"3. 目标受众：{audience}",
-            "",
-            "## 输出要求",
-            "- 提供一个抓人开头（前5秒），给出3个要点，并以明确的CTA结尾。",
-            "- 如果 format 是 caption，则输出简短有力的标题和若干标签。",
-            "- 保持贴合平台规范。",
-            "- 要求每个时间段的字数在150-200字每分钟。",
-            "- 按照json格式输出，包含以下字段："
-            "  - script/caption: 文案内容",
-            "  - time 文案内容的时间段"
-            "  - title 每段文案的标题（仅限caption）",
-        ]
-        return "\n".join(prompt_parts)
-
-    def generate(self, brief: str, platform: str = "short-video", fmt: str = "script", tone: Optional[str] = None, length: Optional[str] = None, audience: str = "general", n: int = 1, similarity: int = 100, **kwargs) -> List[str]:
+        return _render_video_prompt(brief, platform, fmt, tone or self.default_tone, length or self.default_length, audience)
+
+    def _make_prompt(self, brief: str, platform: str, fmt: str, tone: Optional[str], length: Optional[str], audience: str, similarity: int) -> str:
+        prompt = self.build_prompt(brief, platform=platform, fmt=fmt, tone=tone, length=length, audience=audience)
         if similarity == 100:
-            prompt = self.build_prompt(brief, platform=platform, fmt=fmt, tone=tone, length=length, audience=audience)
-            prompt += f"- 按照{similarity}%的相似度生成不同版本的文案。\n"
-            prompt += "确保与原文案在结构和内容上有明显区别，但仍然传达相同的信息和情感。\n"
+            prompt += _SIMILARITY_SUFFIX
+        return prompt
+
+    def generate(self, brief: str, platform: str = "short-video", fmt: str = "script", tone: Optional[str] = None, length: Optional[str] = None, audience: str = "general", n: int = 1, similarity: int = 100, stream: bool = False, **kwargs) -> List[str]:
+        prompt = self._make_prompt(brief, platform, fmt, tone, length, audience, similarity)
+        if stream:
+            # Streaming yields one completion per request
+            return self._generate_concurrently(prompt, n, stream=True, **kwargs)
+
+        supports_n = getattr(self.client, "supports_n", None)
+        if n > 1 and supports_n is not None and not supports_n(kwargs.get("model")):
+            # The model has no server-side n: ask for all variants as a JSON array in one completion
+            reply = self.client.generate(self._batch_prompt([prompt], n), **kwargs)
+            results = _parse_batch_reply(reply, 1, n)[0]
+            if len(results) < n:
+                logger.warning("JSON reply contained %s/%s variants, generating the rest individually", len(results), n)
+                results.extend(self._generate_concurrently(prompt, n - len(results), **kwargs))
+            return results
+        # Errors meaning the provider refused the batched request (e.g. requests.HTTPError)
+        rejected = getattr(self.client, "BATCH_REJECTED_ERRORS", ())
+        try:
+            # Ask the provider for all variants in one round-trip
+            result = self.client.generate(prompt, n=n, **kwargs)
+        except rejected as exc:
+            # Rate limits and server errors have already been retried; fanning out would only add load
+            status = getattr(getattr(exc, "response", None), "status_code", None)
+            if status not in PARAM_REJECTED_STATUS:
+                raise
+            logger.warning("Batched request with n=%s rejected (%s), falling back to one request per variant", n, exc)
+            return self._generate_concurrently(prompt, n, **kwargs)
+
+        if isinstance(result, list):
+            results = [str(r).strip() for r in result[:n]]
         else:
-            prompt = self.build_prompt(brief, platform=platform, fmt=fmt, tone=tone, length=length, audience=audience)
-        
-        results = []
-        for _ in range(n):
-            text = self.client.generate(prompt, **kwargs)
-            results.append(text.strip())
-        return results
\ No newline at end of file
+            results = [str(result).strip()]
+        # Some providers silently ignore n; top up with single requests
+        if len(results) < n:
+            results.extend(self._generate_concurrently(prompt, n - len(results), **kwargs))
+        return results
+
+    def generate_many(self, briefs: List[str], platform: str = "short-video", fmt: str = "script", tone: Optional[str] = None, length: Optional[str] = None, audience: str = "general", n: int = 1, similarity: int = 100, **kwargs) -> List[List[str]]:
+        """Generate n variants for each of several briefs with a single request.
+
+        Returns one list of variants per brief, in input order. Briefs the model's
+        JSON reply does not fully cover are retried through `generate`.
+        """
+        opts = dict(platform=platform, fmt=fmt, tone=tone, length=length, audience=audience, similarity=similarity)
+        if len(briefs) <= 1:
+            return [self.generate(brief, n=n, **opts, **kwargs) for brief in briefs]
+
+        prompts = [self._make_prompt(brief, platform, fmt, tone, length, audience, similarity) for brief in briefs]
+        reply = self.client.generate(self._batch_prompt(prompts, n), **kwargs)
+        grouped = _parse_batch_reply(reply, len(briefs), n)
+
+        missing = [i for i, variants in enumerate(grouped) if len(variants) < n]
+        if missing:
+            logger.warning("Batch reply covered %s/%s briefs, generating the rest individually", len(briefs) - len(missing), len(briefs))
+            # Retry the uncovered briefs in parallel rather than one round-trip after another
+            with ThreadPoolExecutor(max_workers=min(len(missing), MAX_PARALLEL_REQUESTS)) as ex:
+                retried = ex.map(lambda i: self.generate(briefs[i], n=n, **opts, **kwargs), missing)
+                for i, variants in zip(missing, retried):
+                    grouped[i] = variants
+        return grouped
+
+    @staticmethod
+    def _batch_prompt(prompts: List[str], n: int) -> str:
+        """One prompt asking for n variants of each task as a JSON array (see _parse_batch_reply)."""
+        tasks = "\n\n".join(f"### 任务 {i}\n{prompt}" for i, prompt in enumerate(prompts))
+        return _BATCH_PROMPT_TMPL.format_map({"count": len(prompts), "n": n, "total": len(prompts) * n, "tasks": tasks})
+
+    def _generate_one(self, prompt: str, stream: bool = False, **kwargs) -> str:
+        if not stream:
+            return self.client.generate(prompt, **kwargs).strip()
+        buf = io.StringIO()
+        for chunk in self.client.generate_stream(prompt, **kwargs):
+            buf.write(chunk)
+        return buf.getvalue().strip()
+
+    def _generate_concurrently(self, prompt: str, count: int, stream: bool = False, **kwargs) -> List[str]:
+        """Issue `count` single-variant requests in parallel, preserving order."""
+        if count <= 1:
+            return [self._generate_one(prompt, stream=stream, **kwargs) for _ in range(count)]
+        with ThreadPoolExecutor(max_workers=min(count, MAX_PARALLEL_REQUESTS)) as ex:
+            return list(ex.map(lambda _: self._generate_one(prompt, stream=stream, **kwargs), range(count)))
+
+    async def agenerate(self, brief: str, platform: str = "short-video", fmt: str = "script", tone: Optional[str] = None, length: Optional[str] = None, audience: str = "general", n: int = 1, similarity: int = 100, **kwargs) -> List[str]:
+        """Async variant of `generate`: all n variants are requested concurrently on one event loop.
+
+        Requires a client with `agenerate` (any BaseChatClient with httpx installed).
+        """
+        # Imported here: asyncio is only needed on this path and is slow to import on --mock startup
+        import asyncio
+
+        prompt = self._make_prompt(brief, platform, fmt, tone, length, audience, similarity)
+        texts = await asyncio.gather(*[self.client.agenerate(prompt, **kwargs) for _ in range(n)])
+        return [str(t).strip() for t in texts]
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the rate limiter and provider detection in client.py
+"""
+
+import os
+import json
+import sys
+import unittest
+from unittest.mock import patch
+
+# Make the context modules importable when run from the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import client as client_module
+from generator import VideoGenerator
+from client import _RateLimiter, detect_provider, create_client, BaseChatClient, DeepseekClient, ZhipuClient
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Tests for _RateLimiter"""
+
+    def test_rpm_window(self):
+        limiter = _RateLimiter(rpm=2, max_concurrency=16)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        wait = limiter.try_acquire()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, _RateLimiter.WINDOW)
+
+    def test_concurrency_limit_and_release(self):
+        limiter = _RateLimiter(rpm=100, max_concurrency=2)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertGreater(limiter.try_acquire(), 0)
+        limiter.release(200, 0.1)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+
+    def test_aimd(self):
+        limiter = _RateLimiter(rpm=100, max_concurrency=8)
+        start = limiter.concurrency
+        limiter.try_acquire()
+        limiter.release(429, 0.1)
+        self.assertEqual(limiter.concurrency, start / 2)
+        limiter.try_acquire()
+        limiter.release(200, 0.1)
+        self.assertEqual(limiter.concurrency, start / 2 + 0.5)
+
+    def test_abandon_frees_slot_without_backoff(self):
+        limiter = _RateLimiter(rpm=100, max_concurrency=8)
+        start = limiter.concurrency
+        limiter.try_acquire()
+        limiter.abandon()
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.concurrency, start)
+
+    def test_low_quota_pause_is_capped_and_logged(self):
+        limiter = _RateLimiter(rpm=100)
+        limiter.try_acquire()
+        headers = {
+            "x-ratelimit-limit-requests": "1000",
+            "x-ratelimit-remaining-requests": "5",
+            "x-ratelimit-reset-requests": "6h",
+        }
+        with self.assertLogs("client", level="WARNING") as logs:
+            limiter.release(200, 0.1, headers)
+        self.assertIn("pausing new requests", logs.output[0])
+        self.assertEqual(limiter.rpm, 1000)
+        wait = limiter.try_acquire()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, _RateLimiter.MAX_PAUSE)
+
+    def test_retry_after_is_returned(self):
+        limiter = _RateLimiter(rpm=100)
+        limiter.try_acquire()
+        with self.assertLogs("client", level="WARNING"):
+            self.assertEqual(limiter.release(429, 0.1, {"retry-after": "2"}), 2.0)
+        self.assertLessEqual(limiter.try_acquire(), 2.0)
+
+
+class TestDetectProvider(unittest.TestCase):
+    """Tests for detect_provider / create_client"""
+
+    def test_default_is_zhipu(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(detect_provider(), "zhipu")
+
+    def test_explicit_provider(self):
+        with patch.dict(os.environ, {"CHAT_PROVIDER": "DeepSeek"}, clear=True):
+            self.assertEqual(detect_provider(), "deepseek")
+        with patch.dict(os.environ, {"CHAT_PROVIDER": "openai"}, clear=True):
+            with self.assertRaises(ValueError):
+                detect_provider()
+
+    def test_sniffed_from_base_url(self):
+        with patch.dict(os.environ, {"BIGMODEL_BASE_URL": "https://api.deepseek.com/v1"}, clear=True):
+            self.assertEqual(detect_provider(), "deepseek")
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(detect_provider("https://open.bigmodel.cn/api/paas/v4"), "zhipu")
+            self.assertEqual(detect_provider("https://api.deepseek.com"), "deepseek")
+
+    def test_create_client(self):
+        with patch.dict(os.environ, {"CHAT_PREWARM": "0"}, clear=True):
+            client = create_client("deepseek", api_key="test-key", base_url="https://api.deepseek.com")
+        self.assertIsInstance(client, DeepseekClient)
+        with self.assertRaises(ValueError):
+            create_client("unknown")
+
+
+
+def _sse(obj):
+    return b"data: " + json.dumps(obj).encode("utf-8")
+
+
+_SSE_LINES = [
+    _sse({"choices": [{"delta": {"role": "assistant"}}]}),
+    b"",
+    _sse({"choices": [{"delta": {"content": "你"}}]}),
+    b": keep-alive",
+    b"data:" + json.dumps({"choices": [{"delta": {"content": "好"}}]}).encode("utf-8"),
+    b"event: ping",
+    b"data: {not json",
+    _sse({"choices": []}),
+    _sse({"choices": [{"delta": {"content": ""}}]}),
+    _sse({"choices": [{"delta": {"content": "!"}}]}),
+    b"data: [DONE]",
+    _sse({"choices": [{"delta": {"content": "after done"}}]}),
+]
+
+
+class _StreamResponse:
+    """Stand-in for a streamed requests.Response"""
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+class TestGenerateStream(unittest.TestCase):
+    """Tests for the SSE parsing in generate_stream"""
+
+    def setUp(self):
+        with patch.dict(os.environ, {"CHAT_PREWARM": "0"}):
+            self.client = ZhipuClient(api_key="test-key")
+
+    def test_yields_content_deltas(self):
+        with patch.object(self.client, "_post", return_value=_StreamResponse(_SSE_LINES)) as mock_post:
+            self.assertEqual(list(self.client.generate_stream("hi")), ["你", "好", "!"])
+        self.assertTrue(mock_post.call_args.args[1]["stream"])
+
+    def test_video_generator_stream(self):
+        with patch.object(self.client, "_post", side_effect=lambda *a, **k: _StreamResponse(_SSE_LINES)) as mock_post:
+            results = VideoGenerator(self.client).generate("brief", n=2, stream=True)
+        self.assertEqual(results, ["你好!", "你好!"])
+        self.assertEqual(mock_post.call_count, 2)
+
+
+@unittest.skipIf(client_module.httpx is None, "httpx not installed")
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+    """Tests for the shared httpx.AsyncClient"""
+
+    async def asyncTearDown(self):
+        await BaseChatClient.aclose()
+
+    async def test_shared_by_providers_and_closed(self):
+        with patch.dict(os.environ, {"CHAT_PREWARM": "0"}):
+            zhipu = ZhipuClient(api_key="test-key")
+            deepseek = DeepseekClient(api_key="test-key")
+        shared = await zhipu._get_async_client()
+        self.assertIs(await deepseek._get_async_client(), shared)
+        await BaseChatClient.aclose()
+        self.assertTrue(shared.is_closed)
+        self.assertIsNone(BaseChatClient._async_client)
+
+
+if __name__ == '__main__':
+    unittest.main()
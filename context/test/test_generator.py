@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the batch-reply parsing in generator.py
+"""
+
+import json
+import os
+import sys
+import threading
+import unittest
+
+# Make the context modules importable when run from the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from generator import VideoGenerator, _parse_batch_reply
+
+
+class TestParseBatchReply(unittest.TestCase):
+    """Tests for _parse_batch_reply"""
+
+    def test_string_text(self):
+        reply = json.dumps([
+            {"brief_idx": 0, "variant_idx": 0, "text": " first "},
+            {"brief_idx": 1, "variant_idx": 0, "text": "second"},
+        ])
+        self.assertEqual(_parse_batch_reply(reply, 2, 1), [["first"], ["second"]])
+
+    def test_object_text_is_kept_as_json(self):
+        reply = json.dumps([{"brief_idx": 0, "text": {"script/caption": "hi", "title": "标题"}}], ensure_ascii=False)
+        grouped = _parse_batch_reply(reply, 1, 1)
+        self.assertEqual(json.loads(grouped[0][0]), {"script/caption": "hi", "title": "标题"})
+        self.assertIn("标题", grouped[0][0])
+
+    def test_fenced_reply(self):
+        reply = "好的：\n```json\n" + json.dumps([
+            {"brief_idx": 0, "variant_idx": 0, "text": "a"},
+            {"brief_idx": 0, "variant_idx": 1, "text": "b"},
+            {"brief_idx": 0, "variant_idx": 2, "text": "c"},
+        ]) + "\n```"
+        # Extra variants beyond n are dropped
+        self.assertEqual(_parse_batch_reply(reply, 1, 2), [["a", "b"]])
+
+    def test_list_reply_uses_first_choice(self):
+        reply = [json.dumps([{"brief_idx": 0, "text": "a"}]), "ignored"]
+        self.assertEqual(_parse_batch_reply(reply, 1, 1), [["a"]])
+
+    def test_truncated_reply(self):
+        reply = '[{"brief_idx": 0, "text": "a"}, {"brief_idx": 1, "te'
+        self.assertEqual(_parse_batch_reply(reply, 2, 1), [[], []])
+
+    def test_invalid_items_are_skipped(self):
+        reply = json.dumps([
+            {"brief_idx": 5, "text": "out of range"},
+            {"brief_idx": "x", "text": "bad index"},
+            {"brief_idx": 0},
+            {"brief_idx": 0, "text": None},
+            {"brief_idx": 0, "text": "ok"},
+        ])
+        self.assertEqual(_parse_batch_reply(reply, 1, 1), [["ok"]])
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {"status_code": status_code})()
+
+
+class _RejectingClient:
+    """Fails every n>1 request with the given status, answers single requests"""
+
+    BATCH_REJECTED_ERRORS = (_HTTPError,)
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.calls = []
+
+    def generate(self, prompt, n=1, **kwargs):
+        self.calls.append(n)
+        if n > 1:
+            raise _HTTPError(self.status_code)
+        return "variant"
+
+
+class TestBatchFallback(unittest.TestCase):
+    """Tests for VideoGenerator.generate falling back to one request per variant"""
+
+    def test_rejected_parameter_falls_back(self):
+        client = _RejectingClient(400)
+        with self.assertLogs("generator", level="WARNING"):
+            self.assertEqual(VideoGenerator(client).generate("brief", n=3), ["variant"] * 3)
+        self.assertEqual(client.calls, [3, 1, 1, 1])
+
+    def test_rate_limit_is_not_fanned_out(self):
+        for status in (429, 503):
+            client = _RejectingClient(status)
+            with self.assertRaises(_HTTPError):
+                VideoGenerator(client).generate("brief", n=3)
+            self.assertEqual(client.calls, [3])
+
+
+
+class _NoNClient:
+    """A client whose model has no server-side n; batch prompts get `reply`"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def supports_n(self, model=None):
+        return False
+
+    def generate(self, prompt, n=1, **kwargs):
+        self.calls.append(n)
+        return self.reply if "brief_idx" in prompt else "single"
+
+
+class TestJsonArrayVariants(unittest.TestCase):
+    """Tests for VideoGenerator.generate when the model does not support n"""
+
+    def test_full_reply_is_one_call(self):
+        reply = json.dumps([{"brief_idx": 0, "variant_idx": i, "text": f"v{i}"} for i in range(3)])
+        client = _NoNClient(reply)
+        self.assertEqual(VideoGenerator(client).generate("brief", n=3), ["v0", "v1", "v2"])
+        self.assertEqual(client.calls, [1])
+
+    def test_partial_reply_is_topped_up(self):
+        reply = json.dumps([{"brief_idx": 0, "variant_idx": 0, "text": "v0"}])
+        client = _NoNClient(reply)
+        with self.assertLogs("generator", level="WARNING"):
+            results = VideoGenerator(client).generate("brief", n=3)
+        self.assertEqual(results, ["v0", "single", "single"])
+        self.assertEqual(client.calls, [1, 1, 1])
+
+
+class _BatchClient:
+    """Returns `reply` for batch prompts; single requests wait until `parallel` of them are in flight"""
+
+    def __init__(self, reply, parallel=1):
+        self.reply = reply
+        self.barrier = threading.Barrier(parallel, timeout=5)
+        self.calls = []
+
+    def generate(self, prompt, n=1, **kwargs):
+        is_batch = "brief_idx" in prompt
+        self.calls.append("batch" if is_batch else "single")
+        if is_batch:
+            return self.reply
+        self.barrier.wait()
+        return "single"
+
+
+class TestGenerateMany(unittest.TestCase):
+    """Tests for VideoGenerator.generate_many"""
+
+    def test_full_reply_is_one_call(self):
+        reply = json.dumps([{"brief_idx": i, "variant_idx": 0, "text": f"t{i}"} for i in range(3)])
+        client = _BatchClient(reply)
+        self.assertEqual(VideoGenerator(client).generate_many(["a", "b", "c"]), [["t0"], ["t1"], ["t2"]])
+        self.assertEqual(client.calls, ["batch"])
+
+    def test_uncovered_briefs_are_retried_in_parallel(self):
+        # The barrier only opens once all three retries run at the same time
+        client = _BatchClient('[{"brief_idx": 0, "te', parallel=3)
+        with self.assertLogs("generator", level="WARNING"):
+            grouped = VideoGenerator(client).generate_many(["a", "b", "c"])
+        self.assertEqual(grouped, [["single"]] * 3)
+        self.assertEqual(client.calls, ["batch"] + ["single"] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
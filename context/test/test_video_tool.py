@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the response cache in video_tool.py
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+import zlib
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+# Make the context modules importable when run from the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from video_tool import ResponseCache, generate_with_cache
+
+
+class _FakeGenerator:
+    """Records the briefs it is asked for and returns one variant per brief"""
+
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, brief, **kwargs):
+        self.calls.append([brief])
+        return [f"copy for {brief}"]
+
+    def generate_many(self, briefs, **kwargs):
+        self.calls.append(list(briefs))
+        return [[f"copy for {brief}"] for brief in briefs]
+
+
+class TestResponseCache(unittest.TestCase):
+    """Tests for ResponseCache and generate_with_cache"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.test_dir, "responses.sqlite3"))
+        self.briefs = ["a", "b"]
+        self.keys = [ResponseCache.make_key(brief=brief, n=1) for brief in self.briefs]
+
+    def tearDown(self):
+        self.cache.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def _run(self, gen, cache):
+        with redirect_stdout(StringIO()) as out:
+            results = generate_with_cache(gen, self.briefs, {}, cache, self.keys, ttl_days=7)
+        return results, out.getvalue()
+
+    def test_hit(self):
+        self.cache.set(self.keys[0], ["cached a"])
+        gen = _FakeGenerator()
+        results, _ = self._run(gen, self.cache)
+        self.assertEqual(results, [["cached a"], ["copy for b"]])
+        # Only the uncached brief is generated, and it is stored for next time
+        self.assertEqual(gen.calls, [["b"]])
+        self.assertEqual(self.cache.get(self.keys[1], 7), ["copy for b"])
+
+    def test_ttl_expiry(self):
+        self.cache.set(self.keys[0], ["cached a"])
+        with self.cache.conn:
+            self.cache.conn.execute("UPDATE responses SET created_at = created_at - ?", (8 * 86400,))
+        self.assertIsNone(self.cache.get(self.keys[0], 7))
+        self.assertEqual(self.cache.get(self.keys[0], 10), ["cached a"])
+
+    def test_corrupt_row_is_a_miss(self):
+        with self.cache.conn:
+            self.cache.conn.execute("INSERT INTO responses VALUES (?, strftime('%s','now'), ?)", (self.keys[0], b"junk"))
+            self.cache.conn.execute("INSERT INTO responses VALUES (?, strftime('%s','now'), ?)", (self.keys[1], zlib.compress(b"{bad")))
+        self.assertIsNone(self.cache.get(self.keys[0], 7))
+        self.assertIsNone(self.cache.get(self.keys[1], 7))
+        count = self.cache.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self.assertEqual(count, 0)
+
+    def test_failed_write_does_not_abort(self):
+        gen = _FakeGenerator()
+        with patch.object(self.cache, "set", side_effect=sqlite3.OperationalError("database is locked")):
+            results, out = self._run(gen, self.cache)
+        self.assertEqual(results, [["copy for a"], ["copy for b"]])
+        self.assertIn("响应缓存不可用", out)
+
+    def test_failed_read_generates_uncached(self):
+        gen = _FakeGenerator()
+        with patch.object(self.cache, "get", side_effect=sqlite3.OperationalError("database is locked")):
+            results, out = self._run(gen, self.cache)
+        self.assertEqual(results, [["copy for a"], ["copy for b"]])
+        self.assertEqual(gen.calls, [["a", "b"]])
+        self.assertIn("响应缓存不可用", out)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,86 +1,106 @@
-"""CLI tool to generate video copy (scripts/captions) using Deepseek"""
+"""CLI tool to generate video copy (scripts/captions) using Zhipu or DeepSeek"""
 from __future__ import annotations
 
 import argparse
+import hashlib
+import itertools
 import json
-import os
+import re
+import sqlite3
+import sys
+import time
+import zlib
 from pathlib import Path
 from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional
 
-# Load .env if present
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except Exception:
-    pass
+# client (requests) and dotenv are imported lazily so --mock runs never load them
+from generator import VideoGenerator
 
-# Prefer local imports
+# Optional: orjson serializes log entries and results straight to UTF-8 bytes
 try:
-    from generator import VideoGenerator
-    from client import DeepseekClient
-except Exception:
-    from context.generator import VideoGenerator
-    from context.client import DeepseekClient
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Inline hashtags; str patterns make \w Unicode-aware, so CJK tags (#美食) match too
+HASHTAG_RE = re.compile(r"#\w+")
 
 
 class MockClient:
     def generate(self, prompt: str, n: int = 1, **kwargs):
         # Return string if n==1 else list of strings; include platform hint if present in prompt
-        brief_line = prompt.splitlines()[4] if len(prompt.splitlines()) > 4 else "(brief)"
+        lines = prompt.split("\n", 5)
+        brief_line = lines[4] if len(lines) > 4 else "(brief)"
         base = f"[MOCK] 视频文案基于: {brief_line[:80]}..."
         if n is None or n <= 1:
             return base
         return [f"{base} (变体 {i+1})" for i in range(n)]
 
 
-def main():
-    p = argparse.ArgumentParser(description="Generate video copy (script/caption) using Deepseek")
-    p.add_argument("brief", help="Short brief describing the product or video idea")
-    p.add_argument("-p", "--platform", default="short-video", help="Platform (e.g., douyin, tiktok, youtube)")
-    p.add_argument("-f", "--format", dest="fmt", default="script", help="Format: script or caption")
-    p.add_argument("-t", "--tone", help="Tone (e.g., energetic, professional)")
-    p.add_argument("-l", "--length", help="Length (short, medium, long)")
-    p.add_argument("-n", "--number", type=int, default=1, help="Number of variants to generate")
-    p.add_argument("-s", "--similarity", type=int, default=100, help="Similarity percentage to original brief (0-100)")
-    p.add_argument("--out", help="Output file (JSON). If omitted, prints to stdout")
-    p.add_argument("--mock", action="store_true", help="Run in mock/offline mode (no network)")
-    p.add_argument("--debug", action="store_true", help="Show debug info (provider, model, masked API key)")
-    p.add_argument("--log-pretty", action="store_true", help="Write pretty JSON into the log file (one object per line by default)")
-    args = p.parse_args()
+def _dumps(obj: Any, pretty: bool = False) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if pretty else None).encode("utf-8")
 
-    if args.mock:
-        client = MockClient()
-        if args.debug:
-            print(f"Provider: Zhipu/BigModel (mock)\nPlatform: {args.platform}\nAPI key: (mock)")
-    else:
-        api_key = os.getenv("ZHIPU_API_KEY") or os.getenv("BIGMODEL_API_KEY") or os.getenv("DEEPSEEK_API_KEY")
-        if not api_key:
-            raise SystemExit("Please set ZHIPU_API_KEY environment variable or use --mock for offline testing.")
-        if args.debug:
-            masked = api_key[:4] + "..." + api_key[-4:] if len(api_key) > 8 else "****"
-            print(f"Provider: Zhipu/BigModel\nPlatform: {args.platform}\nAPI key (masked): {masked}")
-        client = DeepseekClient(api_key=api_key)
 
-    gen = VideoGenerator(client)
-    try:
-        results = gen.generate(args.brief, platform=args.platform, fmt=args.fmt, tone=args.tone, length=args.length, n=args.number)
-    except Exception as e:
-        print(f"网络或API错误: {e}\n提示：可以使用 --mock 进行本地测试，或检查网络/API Key 设置。")
-        raise
+def _loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
-    # Append a JSON log entry to context_generated.log in the same folder as this script
-    log_path = Path(__file__).parent / "context_generated.log"
 
-    # Try to use structured JSON if the generated result is already JSON matching expected schema
-    def try_parse_result_as_schema(text: str):
+class ResponseCache:
+    """SQLite cache of generated results keyed on the request parameters (payload is zlib-compressed JSON)."""
+
+    DEFAULT_PATH = Path("~/.cache/videolingua/responses.sqlite3").expanduser()
+
+    def __init__(self, path: Optional[Path] = None):
+        path = Path(path) if path else self.DEFAULT_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created_at INTEGER, payload BLOB)"
+        )
+
+    @staticmethod
+    def make_key(**params: Any) -> str:
+        raw = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, ttl_days: float) -> Optional[Any]:
+        row = self.conn.execute("SELECT created_at, payload FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[0] > ttl_days * 86400:
+            return None
         try:
-            obj = json.loads(text)
-            if isinstance(obj, dict) and "script/caption" in obj:
-                return obj
-        except Exception:
-            pass
-        return None
+            return _loads(zlib.decompress(row[1]))
+        except (zlib.error, ValueError, TypeError):
+            # Corrupt or old-format row: drop it and treat as a miss
+            with self.conn:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        payload = zlib.compress(_dumps(value))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, created_at, payload) VALUES (?, ?, ?)",
+                (key, int(time.time()), payload),
+            )
+
+
+# Try to use structured JSON if the generated result is already JSON matching expected schema
+def try_parse_result_as_schema(text: str):
+    try:
+        obj = _loads(text)
+        if isinstance(obj, dict) and "script/caption" in obj:
+            return obj
+    except Exception:
+        pass
+    return None
 
+
+def build_log_entry(args: argparse.Namespace, brief: str, results: List[str]) -> Dict[str, Any]:
     body = None
     # If there is exactly one result and it's JSON with the desired schema, use it
     if len(results) == 1:
@@ -92,25 +112,21 @@ def main():
     if body is None:
         body = {
             "script/caption": [],
-            "title": args.brief,
+            "title": brief,
             "tags": [],
         }
         for r in results:
-            # try to extract tags from inline hashtags
-            tags = [t for t in r.split() if t.startswith("#")]
-            if tags:
-                body["tags"].extend(tags)
             body["script/caption"].append({
                 "time": "0-60s",
                 "title": "",
                 "caption": r,
             })
-        # dedupe tags
-        body["tags"] = list(dict.fromkeys(body["tags"]))
+        # extract inline hashtags from all results, deduped in first-seen order
+        body["tags"] = list(dict.fromkeys(itertools.chain.from_iterable(HASHTAG_RE.findall(r) for r in results)))
 
-    log_entry = {
+    return {
         "timestamp": datetime.now().isoformat(),
-        "brief": args.brief,
+        "brief": brief,
         "platform": args.platform,
         "format": args.fmt,
         "tone": args.tone,
@@ -119,24 +135,143 @@ def main():
         "data": body,
     }
 
+
+def generate_with_cache(gen: VideoGenerator, briefs: List[str], opts: Dict[str, Any],
+                        cache: Optional[ResponseCache] = None, keys: Optional[List[str]] = None, ttl_days: float = 7) -> List[List[str]]:
+    """Generate results for each brief, answering identical requests from `cache` (keys parallel to briefs).
+
+    Cache failures (e.g. the database is locked by another run) only print a warning; generation goes on uncached.
+    """
+    all_results: List[Optional[List[str]]] = [None] * len(briefs)
+    if cache:
+        try:
+            all_results = [cache.get(key, ttl_days) for key in keys or []]
+        except sqlite3.Error as e:
+            print(f"Warning: 响应缓存不可用: {e}")
+            cache = None
+    missing = [i for i, results in enumerate(all_results) if results is None]
+    if len(missing) < len(briefs):
+        print(f"Loaded {len(briefs) - len(missing)} brief(s) from the response cache")
+
+    if len(missing) == 1:
+        fresh = [gen.generate(briefs[missing[0]], **opts)]
+    elif missing:
+        # Several briefs are batched into one request
+        fresh = gen.generate_many([briefs[i] for i in missing], **opts)
+    else:
+        fresh = []
+    for i, results in zip(missing, fresh):
+        all_results[i] = results
+        if cache and results:
+            try:
+                cache.set(keys[i], results)
+            except sqlite3.Error as e:
+                print(f"Warning: 响应缓存不可用: {e}")
+                cache = None
+    return all_results
+
+
+def append_log(entry: Dict[str, Any], f: BinaryIO, pretty: bool = False) -> None:
+    """Write one JSON log entry to an already open binary log handle."""
+    f.write(_dumps(entry, pretty=pretty) + b"\n")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Generate video copy (script/caption) using Zhipu or DeepSeek")
+    p.add_argument("brief", nargs="?", help="Short brief describing the product or video idea")
+    p.add_argument("--briefs-file", help="Text file with one brief per line; all briefs are generated in one batched request")
+    p.add_argument("--batch-in", action="store_true", help="Read additional briefs from stdin, one per line")
+    p.add_argument("-p", "--platform", default="short-video", help="Platform (e.g., douyin, tiktok, youtube)")
+    p.add_argument("-f", "--format", dest="fmt", default="script", help="Format: script or caption")
+    p.add_argument("-t", "--tone", help="Tone (e.g., energetic, professional)")
+    p.add_argument("-l", "--length", help="Length (short, medium, long)")
+    p.add_argument("-n", "--number", type=int, default=1, help="Number of variants to generate")
+    p.add_argument("-s", "--similarity", type=int, default=100, help="Similarity percentage to original brief (0-100)")
+    p.add_argument("--out", help="Output file (JSON). If omitted, prints to stdout")
+    p.add_argument("--mock", action="store_true", help="Run in mock/offline mode (no network)")
+    p.add_argument("--no-cache", action="store_true", help="Do not read or write the on-disk response caches")
+    p.add_argument("--cache-ttl", type=float, default=7, help="Days a cached result is reused for an identical request (default 7)")
+    p.add_argument("--debug", action="store_true", help="Show debug info (provider, model, masked API key)")
+    p.add_argument("--log-pretty", action="store_true", help="Write pretty JSON into the log file (one object per line by default)")
+    args = p.parse_args()
+
+    if args.mock:
+        client = MockClient()
+        if args.debug:
+            print(f"Provider: Zhipu/BigModel (mock)\nPlatform: {args.platform}\nAPI key: (mock)")
+    else:
+        # Load .env if present
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except Exception:
+            pass
+        from client import PROVIDERS, detect_provider
+
+        # Provider comes from CHAT_PROVIDER or the configured base URL (Zhipu by default)
+        client_cls = PROVIDERS[detect_provider()]
+        api_key = client_cls.api_key_from_env()
+        if not api_key:
+            raise SystemExit(f"Please set {client_cls.API_KEY_ENVS[0]} environment variable or use --mock for offline testing.")
+        if args.debug:
+            masked = api_key[:4] + "..." + api_key[-4:] if len(api_key) > 8 else "****"
+            print(f"Provider: {client_cls.DISPLAY_NAME}\nPlatform: {args.platform}\nAPI key (masked): {masked}")
+        client = client_cls(api_key=api_key, use_cache=not args.no_cache)
+
+    briefs = [args.brief] if args.brief else []
+    if args.briefs_file:
+        lines = Path(args.briefs_file).read_text(encoding="utf-8").splitlines()
+        briefs.extend(line.strip() for line in lines if line.strip())
+    if args.batch_in:
+        briefs.extend(line.strip() for line in sys.stdin if line.strip())
+    if not briefs:
+        p.error("provide a brief, --briefs-file or --batch-in")
+
+    gen = VideoGenerator(client)
+    opts = dict(platform=args.platform, fmt=args.fmt, tone=args.tone, length=args.length, n=args.number)
+
+    # Identical requests are answered from the response cache (never in mock mode)
+    cache = None
+    if not args.mock and not args.no_cache:
+        try:
+            cache = ResponseCache()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: 响应缓存不可用: {e}")
+    keys = [
+        ResponseCache.make_key(provider=client_cls.DISPLAY_NAME, model=client_cls.DEFAULT_MODEL, brief=brief, **opts)
+        for brief in briefs
+    ] if cache else []
+
+    try:
+        all_results = generate_with_cache(gen, briefs, opts, cache, keys, args.cache_ttl)
+    except Exception as e:
+        print(f"网络或API错误: {e}\n提示：可以使用 --mock 进行本地测试，或检查网络/API Key 设置。")
+        raise
+
+    # Append JSON log entries to context_generated.log in the same folder as this script;
+    # the file is opened once (O_APPEND) and buffered so a whole batch lands in a few writes
+    log_path = Path(__file__).parent / "context_generated.log"
     try:
-        with log_path.open("a", encoding="utf-8") as f:
-            if args.log_pretty:
-                f.write(json.dumps(log_entry, ensure_ascii=False, indent=2) + "\n")
-            else:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        print(f"Appended {len(results)} result(s) to {log_path}")
+        with log_path.open("ab", buffering=1 << 16) as f:
+            for brief, results in zip(briefs, all_results):
+                append_log(build_log_entry(args, brief, results), f, pretty=args.log_pretty)
+        print(f"Appended {sum(len(r) for r in all_results)} result(s) to {log_path}")
     except Exception as e:
         print(f"Warning: 无法写入日志文件 {log_path}: {e}")
 
     if args.out:
         out_path = Path(args.out)
-        out_path.write_text(json.dumps({"brief": args.brief, "results": results}, ensure_ascii=False, indent=2), encoding="utf-8")
-        print(f"Saved {len(results)} result(s) to {out_path}")
+        outputs = [{"brief": brief, "results": results} for brief, results in zip(briefs, all_results)]
+        # Keep the single-object shape for the common one-brief case
+        out_path.write_bytes(_dumps(outputs[0] if len(outputs) == 1 else outputs, pretty=True))
+        print(f"Saved {sum(len(r) for r in all_results)} result(s) to {out_path}")
     else:
         print("\n--- Generated video copy ---\n")
-        for i, r in enumerate(results, 1):
-            print(f"[{i}] {r}\n")
+        for brief, results in zip(briefs, all_results):
+            if len(briefs) > 1:
+                print(f"## {brief}\n")
+            for i, r in enumerate(results, 1):
+                print(f"[{i}] {r}\n")
 
 
 if __name__ == "__main__":